@@ -1,5 +1,6 @@
-import io
+import ast
 import os
+import pathlib
 
 from setuptools import find_packages, setup
 
@@ -7,19 +8,18 @@ HERE = os.path.abspath(os.path.dirname(__file__))
 
 
 def load_readme():
-    with io.open(os.path.join(HERE, "README.rst"), "rt", encoding="utf8") as f:
-        return f.read()
+    return pathlib.Path(HERE, "README.rst").read_text(encoding="utf8")
 
 
 def load_about():
-    about = {}
-    with io.open(
-        os.path.join(HERE, "tutorcloudfront", "__about__.py"),
-        "rt",
-        encoding="utf-8",
-    ) as f:
-        exec(f.read(), about)  # pylint: disable=exec-used
-    return about
+    tree = ast.parse(pathlib.Path(HERE, "tutorcloudfront", "__about__.py").read_text(encoding="utf-8"))
+    return {
+        target.id: ast.literal_eval(node.value)
+        for node in tree.body
+        if isinstance(node, ast.Assign)
+        for target in node.targets
+        if isinstance(target, ast.Name)
+    }
 
 
 ABOUT = load_about()
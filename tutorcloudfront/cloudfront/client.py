@@ -1,7 +1,162 @@
-from typing import Any, Dict, List, Optional, Union, cast
+import copy
+import hashlib
+import json
+import random
+import threading
+import time
+from functools import lru_cache, wraps
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple, TypeVar, cast
 from uuid import uuid4
 
-import boto3
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+# Error codes CloudFront responds with when the request rate is exceeded.
+_THROTTLING_ERROR_CODES = ("Throttling", "ThrottlingException", "RequestLimitExceeded")
+
+# The static parts of the policy configs; the name, comment, and TTLs
+# are set per policy when the policy is created.
+_CACHE_POLICY_TEMPLATE: Mapping[str, Any] = MappingProxyType(
+    {
+        "ParametersInCacheKeyAndForwardedToOrigin": {
+            "EnableAcceptEncodingGzip": True,
+            "EnableAcceptEncodingBrotli": True,
+            "HeadersConfig": {
+                "HeaderBehavior": "whitelist",
+                "Headers": {
+                    "Quantity": 1,
+                    "Items": [
+                        "Origin",
+                    ],
+                },
+            },
+            "CookiesConfig": {
+                "CookieBehavior": "none",
+            },
+            "QueryStringsConfig": {
+                "QueryStringBehavior": "all",
+            },
+        },
+    }
+)
+
+_ORIGIN_REQUEST_POLICY_TEMPLATE: Mapping[str, Any] = MappingProxyType(
+    {
+        "HeadersConfig": {
+            "HeaderBehavior": "whitelist",
+            "Headers": {
+                "Quantity": 1,
+                "Items": [
+                    "Origin",
+                ],
+            },
+        },
+        "CookiesConfig": {
+            "CookieBehavior": "none",
+        },
+        "QueryStringsConfig": {
+            "QueryStringBehavior": "all",
+        },
+    }
+)
+
+_RESPONSE_HEADERS_POLICY_TEMPLATE: Mapping[str, Any] = MappingProxyType(
+    {
+        "CorsConfig": {
+            "OriginOverride": True,
+            "AccessControlAllowCredentials": False,
+            "AccessControlMaxAgeSec": 2592000,  # 30 days
+            "AccessControlAllowOrigins": {
+                "Quantity": 1,
+                "Items": [
+                    "*",
+                ],
+            },
+            "AccessControlAllowHeaders": {
+                "Quantity": 1,
+                "Items": [
+                    "*",
+                ],
+            },
+            "AccessControlAllowMethods": {
+                "Quantity": 1,
+                "Items": [
+                    "ALL",
+                ],
+            },
+        },
+    }
+)
+
+
+def _retry_on(
+    error_codes: Tuple[str, ...],
+    base: float = 0.5,
+    cap: float = 30.0,
+    max_attempts: int = 5,
+) -> Callable[[_F], _F]:
+    """
+    Retry the decorated function with exponential backoff and jitter when it
+    fails with any of the given AWS error codes.
+    """
+
+    def decorator(func: _F) -> _F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            from botocore.exceptions import ClientError
+
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except ClientError as error:
+                    attempt += 1
+                    if error.response.get("Error", {}).get("Code") not in error_codes or attempt >= max_attempts:
+                        raise
+
+                    time.sleep(min(cap, base * 2 ** (attempt - 1)) + random.random() * 0.5)
+
+        return cast(_F, wrapper)
+
+    return decorator
+
+
+@lru_cache(maxsize=256)
+def _sanitize_name(name: str) -> str:
+    """
+    Takes the original name and returns an API compliant naming.
+    """
+
+    return name.lower().replace(".", "-").replace(" ", "-")
+
+
+@lru_cache(maxsize=4)
+def _create_boto_client(region: str, access_key_id: str, secret_access_key: str) -> Any:
+    """
+    Create a CloudFront boto3 client, reusing the clients created earlier in
+    the process for the same credentials, as creating them is expensive.
+    """
+
+    # boto3 is imported here, as importing it is slow, and the plugin is
+    # imported by every tutor command, not only by the CloudFront ones.
+    import boto3
+    from botocore.config import Config
+
+    session = boto3.Session(
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        region_name=region,
+    )
+
+    # Keep enough pooled, kept-alive connections for the concurrently
+    # provisioned domains, and let botocore back off when throttled.
+    config = Config(
+        max_pool_connections=16,
+        retries={"mode": "adaptive", "max_attempts": 10},
+        tcp_keepalive=True,
+    )
+
+    return session.client("cloudfront", config=config)
 
 
 class CloudFrontClient:
@@ -10,36 +165,81 @@ class CloudFrontClient:
     """
 
     def __init__(self, region: str, access_key_id: str, secret_access_key: str) -> None:
-        __session = boto3.Session(
-            aws_access_key_id=access_key_id,
-            aws_secret_access_key=secret_access_key,
-            region_name=region,
-        )
+        self.__client = _create_boto_client(region, access_key_id, secret_access_key)
 
-        self.__client = __session.client("cloudfront")
+        # The indexes are shared between the threads provisioning the domains,
+        # hence every index has its own lock guarding its loading and updates.
+        self._cache_policy_index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._origin_request_policy_index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._response_headers_policy_index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._distribution_index: Optional[Dict[str, Dict[str, Any]]] = None
 
-    def __sanitize_name(self, name: str) -> str:
+        self.__cache_policy_lock = threading.Lock()
+        self.__origin_request_policy_lock = threading.Lock()
+        self.__response_headers_policy_lock = threading.Lock()
+        self.__distribution_lock = threading.Lock()
+
+    def __list_policies(self, operation: str, policy_type: str) -> Dict[str, Dict[str, Any]]:
         """
-        Takes the original name and returns an API compliant naming.
+        List the custom policies of the given type, indexed by their name.
         """
 
-        return name.lower().replace(".", "-").replace(" ", "-")
+        list_policies = getattr(self.__client, operation)
+        config_key = f"{policy_type}Config"
+        index: Dict[str, Dict[str, Any]] = {}
+        marker: Optional[str] = None
+
+        # botocore has no paginators for the policy listings, hence follow the
+        # markers manually, otherwise policies beyond the first page are missed.
+        while True:
+            params = {"Type": "custom"} if marker is None else {"Type": "custom", "Marker": marker}
+            policy_list = list_policies(**params)[f"{policy_type}List"]
+
+            index.update(
+                {item[policy_type][config_key]["Name"]: item[policy_type] for item in policy_list.get("Items", [])}
+            )
+
+            if not (marker := policy_list.get("NextMarker")):
+                return index
 
-    def get_cache_policy(self, name: str) -> Optional[Dict[str, Any]]:
+    def list_cache_policies(self) -> Dict[str, Dict[str, Any]]:
+        """
+        List the custom cache policies, indexed by their name.
+
+        The policies are listed once, the subsequent calls return the index.
+        """
+
+        with self.__cache_policy_lock:
+            if self._cache_policy_index is None:
+                self._cache_policy_index = self.__list_policies("list_cache_policies", "CachePolicy")
+
+            return self._cache_policy_index
+
+    def get_cache_policy(self, name: str, policy_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Find a cache policy by its name.
+
+        If the ID of the policy is known, the policy is fetched by its ID first.
         """
 
-        response = self.__client.list_cache_policies(Type="custom")
-        policy_items = response["CachePolicyList"].get("Items", [])
+        if policy_id is not None and (policy := self.get_cache_policy_by_id(policy_id)) is not None:
+            return policy
 
-        for item in policy_items:
-            policy = cast(Dict[str, Dict[str, Any]], item["CachePolicy"])
-            if policy["CachePolicyConfig"]["Name"] == self.__sanitize_name(name):
-                return policy
+        return self.list_cache_policies().get(_sanitize_name(name))
 
-        return None
+    def get_cache_policy_by_id(self, policy_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a cache policy by its ID.
+        """
+
+        try:
+            response = self.__client.get_cache_policy(Id=policy_id)
+        except self.__client.exceptions.NoSuchCachePolicy:
+            return None
+
+        return cast(Dict[str, Any], response["CachePolicy"])
 
+    @_retry_on(_THROTTLING_ERROR_CODES)
     def create_cache_policy(
         self,
         name: str,
@@ -51,148 +251,171 @@ class CloudFrontClient:
         Create a new cache policy.
         """
 
-        response = self.__client.create_cache_policy(
-            CachePolicyConfig={
-                "Name": self.__sanitize_name(name),
-                "Comment": f"CloudFront cache policy for {name}.",
-                "DefaultTTL": default_ttl,
-                "MaxTTL": max_ttl,
-                "MinTTL": min_ttl,
-                "ParametersInCacheKeyAndForwardedToOrigin": {
-                    "EnableAcceptEncodingGzip": True,
-                    "EnableAcceptEncodingBrotli": True,
-                    "HeadersConfig": {
-                        "HeaderBehavior": "whitelist",
-                        "Headers": {
-                            "Quantity": 1,
-                            "Items": [
-                                "Origin",
-                            ],
-                        },
-                    },
-                    "CookiesConfig": {
-                        "CookieBehavior": "none",
-                    },
-                    "QueryStringsConfig": {
-                        "QueryStringBehavior": "all",
-                    },
-                },
-            }
-        )
+        config = copy.deepcopy(dict(_CACHE_POLICY_TEMPLATE))
+        config["Name"] = _sanitize_name(name)
+        config["Comment"] = f"CloudFront cache policy for {name}."
+        config["DefaultTTL"] = default_ttl
+        config["MaxTTL"] = max_ttl
+        config["MinTTL"] = min_ttl
 
-        return cast(Dict[str, Any], response["CachePolicy"])
+        response = self.__client.create_cache_policy(CachePolicyConfig=config)
+
+        policy = cast(Dict[str, Any], response["CachePolicy"])
+        with self.__cache_policy_lock:
+            if self._cache_policy_index is not None:
+                self._cache_policy_index[policy["CachePolicyConfig"]["Name"]] = policy
+
+        return policy
+
+    def list_origin_request_policies(self) -> Dict[str, Dict[str, Any]]:
+        """
+        List the custom origin request policies, indexed by their name.
+
+        The policies are listed once, the subsequent calls return the index.
+        """
+
+        with self.__origin_request_policy_lock:
+            if self._origin_request_policy_index is None:
+                self._origin_request_policy_index = self.__list_policies(
+                    "list_origin_request_policies", "OriginRequestPolicy"
+                )
 
-    def get_origin_request_policy(self, name: str) -> Optional[Dict[str, Any]]:
+            return self._origin_request_policy_index
+
+    def get_origin_request_policy(self, name: str, policy_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Find an origin request policy by its name.
+
+        If the ID of the policy is known, the policy is fetched by its ID first.
         """
 
-        response = self.__client.list_origin_request_policies(Type="custom")
-        policy_items = response["OriginRequestPolicyList"].get("Items", [])
+        if policy_id is not None and (policy := self.get_origin_request_policy_by_id(policy_id)) is not None:
+            return policy
+
+        return self.list_origin_request_policies().get(_sanitize_name(name))
+
+    def get_origin_request_policy_by_id(self, policy_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Find an origin request policy by its ID.
+        """
 
-        for item in policy_items:
-            policy = cast(Dict[str, Any], item["OriginRequestPolicy"])
-            if policy["OriginRequestPolicyConfig"]["Name"] == self.__sanitize_name(name):
-                return policy
+        try:
+            response = self.__client.get_origin_request_policy(Id=policy_id)
+        except self.__client.exceptions.NoSuchOriginRequestPolicy:
+            return None
 
-        return None
+        return cast(Dict[str, Any], response["OriginRequestPolicy"])
 
+    @_retry_on(_THROTTLING_ERROR_CODES)
     def create_origin_request_policy(self, name: str) -> Dict[str, Any]:
         """
         Create an origin request policy.
         """
 
-        response = self.__client.create_origin_request_policy(
-            OriginRequestPolicyConfig={
-                "Name": self.__sanitize_name(name),
-                "Comment": f"CloudFront origin request policy for {name}.",
-                "HeadersConfig": {
-                    "HeaderBehavior": "whitelist",
-                    "Headers": {
-                        "Quantity": 1,
-                        "Items": [
-                            "Origin",
-                        ],
-                    },
-                },
-                "CookiesConfig": {
-                    "CookieBehavior": "none",
-                },
-                "QueryStringsConfig": {
-                    "QueryStringBehavior": "all",
-                },
-            }
-        )
+        config = copy.deepcopy(dict(_ORIGIN_REQUEST_POLICY_TEMPLATE))
+        config["Name"] = _sanitize_name(name)
+        config["Comment"] = f"CloudFront origin request policy for {name}."
 
-        return cast(Dict[str, Any], response["OriginRequestPolicy"])
+        response = self.__client.create_origin_request_policy(OriginRequestPolicyConfig=config)
+
+        policy = cast(Dict[str, Any], response["OriginRequestPolicy"])
+        with self.__origin_request_policy_lock:
+            if self._origin_request_policy_index is not None:
+                self._origin_request_policy_index[policy["OriginRequestPolicyConfig"]["Name"]] = policy
+
+        return policy
+
+    def list_response_headers_policies(self) -> Dict[str, Dict[str, Any]]:
+        """
+        List the custom response headers policies, indexed by their name.
+
+        The policies are listed once, the subsequent calls return the index.
+        """
+
+        with self.__response_headers_policy_lock:
+            if self._response_headers_policy_index is None:
+                self._response_headers_policy_index = self.__list_policies(
+                    "list_response_headers_policies", "ResponseHeadersPolicy"
+                )
+
+            return self._response_headers_policy_index
 
-    def get_response_headers_policy(self, name: str) -> Optional[Dict[str, Any]]:
+    def get_response_headers_policy(self, name: str, policy_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Find a response headers policy by its name.
+
+        If the ID of the policy is known, the policy is fetched by its ID first.
         """
 
-        response = self.__client.list_response_headers_policies(Type="custom")
-        policy_items = response["ResponseHeadersPolicyList"].get("Items", [])
+        if policy_id is not None and (policy := self.get_response_headers_policy_by_id(policy_id)) is not None:
+            return policy
+
+        return self.list_response_headers_policies().get(_sanitize_name(name))
+
+    def get_response_headers_policy_by_id(self, policy_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a response headers policy by its ID.
+        """
 
-        for item in policy_items:
-            policy = cast(Dict[str, Any], item["ResponseHeadersPolicy"])
-            if policy["ResponseHeadersPolicyConfig"]["Name"] == self.__sanitize_name(name):
-                return policy
+        try:
+            response = self.__client.get_response_headers_policy(Id=policy_id)
+        except self.__client.exceptions.NoSuchResponseHeadersPolicy:
+            return None
 
-        return None
+        return cast(Dict[str, Any], response["ResponseHeadersPolicy"])
 
+    @_retry_on(_THROTTLING_ERROR_CODES)
     def create_response_headers_policy(self, name: str) -> Dict[str, Any]:
         """
         Create a response headers policy.
         """
 
-        response = self.__client.create_response_headers_policy(
-            ResponseHeadersPolicyConfig={
-                "Name": self.__sanitize_name(name),
-                "Comment": f"CloudFront response headers policy for {name}.",
-                "CorsConfig": {
-                    "OriginOverride": True,
-                    "AccessControlAllowCredentials": False,
-                    "AccessControlMaxAgeSec": 2592000,  # 30 days
-                    "AccessControlAllowOrigins": {
-                        "Quantity": 1,
-                        "Items": [
-                            "*",
-                        ],
-                    },
-                    "AccessControlAllowHeaders": {
-                        "Quantity": 1,
-                        "Items": [
-                            "*",
-                        ],
-                    },
-                    "AccessControlAllowMethods": {
-                        "Quantity": 1,
-                        "Items": [
-                            "ALL",
-                        ],
-                    },
-                },
-            }
-        )
+        config = copy.deepcopy(dict(_RESPONSE_HEADERS_POLICY_TEMPLATE))
+        config["Name"] = _sanitize_name(name)
+        config["Comment"] = f"CloudFront response headers policy for {name}."
 
-        return cast(Dict[str, Any], response["ResponseHeadersPolicy"])
+        response = self.__client.create_response_headers_policy(ResponseHeadersPolicyConfig=config)
 
-    def get_distribution(self, domain: str) -> Optional[Dict[str, Any]]:
+        policy = cast(Dict[str, Any], response["ResponseHeadersPolicy"])
+        with self.__response_headers_policy_lock:
+            if self._response_headers_policy_index is not None:
+                self._response_headers_policy_index[policy["ResponseHeadersPolicyConfig"]["Name"]] = policy
+
+        return policy
+
+    def __list_distributions(self) -> Dict[str, Dict[str, Any]]:
         """
-        Finds a CloudFront distribution by its domain name.
+        List the CloudFront distributions, indexed by the domain names of their origins.
         """
 
-        response = self.__client.list_distributions()
-        distribution_items = response["DistributionList"].get("Items", [])
+        return {
+            origin["DomainName"]: distribution
+            for page in self.__client.get_paginator("list_distributions").paginate()
+            for distribution in page["DistributionList"].get("Items", [])
+            for origin in distribution["Origins"].get("Items", [])
+        }
+
+    def list_distributions(self) -> Dict[str, Dict[str, Any]]:
+        """
+        List the CloudFront distributions, indexed by the domain names of their origins.
 
-        for item in distribution_items:
-            distribution = cast(Dict[str, Any], item)
-            if distribution["DomainName"] == domain:
-                return distribution
+        The distributions are listed once, the subsequent calls return the index.
+        """
 
-        return None
+        with self.__distribution_lock:
+            if self._distribution_index is None:
+                self._distribution_index = self.__list_distributions()
 
+            return self._distribution_index
+
+    def get_distribution(self, domain: str) -> Optional[Dict[str, Any]]:
+        """
+        Finds a CloudFront distribution by the domain name of its origin.
+        """
+
+        return self.list_distributions().get(domain)
+
+    @_retry_on(_THROTTLING_ERROR_CODES)
     def create_distribution(
         self,
         domain: str,
@@ -203,6 +426,10 @@ class CloudFrontClient:
     ) -> Dict[str, Any]:
         """
         Create a new CloudFront distribution.
+
+        If the same distribution was already created, the existing distribution
+        is returned as listed by CloudFront. If it was deleted since, it is created
+        again with a new caller reference.
         """
 
         if alias is None:
@@ -212,7 +439,6 @@ class CloudFrontClient:
             "Enabled": True,
             "Staging": False,
             "IsIPV6Enabled": True,
-            "CallerReference": str(uuid4()),
             "Comment": f"Distribution config for {domain}",
             "ViewerCertificate": {
                 "CloudFrontDefaultCertificate": len(alias) == 0,
@@ -278,5 +504,32 @@ class CloudFrontClient:
         if (arn := alias.get("certificate_arn")) is not None:
             config["ViewerCertificate"]["ACMCertificateArn"] = arn
 
-        response = self.__client.create_distribution(DistributionConfig=config)
-        return cast(Dict[str, Any], response["Distribution"])
+        # Derive the caller reference from the config, so CloudFront rejects the
+        # creation of the same distribution again instead of creating a duplicate.
+        caller_reference = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+        config["CallerReference"] = caller_reference
+
+        try:
+            response = self.__client.create_distribution(DistributionConfig=config)
+        except self.__client.exceptions.DistributionAlreadyExists:
+            # The distribution exists but is missing from the index, for example
+            # because it was created after the index was loaded; reload it.
+            with self.__distribution_lock:
+                self._distribution_index = self.__list_distributions()
+                existing = self._distribution_index.get(domain)
+
+            if existing is not None:
+                return existing
+
+            # The distribution created with this reference was deleted since, but
+            # CloudFront never accepts a reference again, so salt it and retry once.
+            config["CallerReference"] = hashlib.sha256(f"{caller_reference}-{uuid4()}".encode("utf-8")).hexdigest()
+            response = self.__client.create_distribution(DistributionConfig=config)
+
+        distribution = cast(Dict[str, Any], response["Distribution"])
+        with self.__distribution_lock:
+            if self._distribution_index is not None:
+                for origin in distribution["DistributionConfig"]["Origins"]["Items"]:
+                    self._distribution_index[origin["DomainName"]] = distribution
+
+        return distribution
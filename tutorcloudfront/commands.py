@@ -1,11 +1,22 @@
-from typing import Any, Dict, List
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict
 
 import click
 from tutor import config
+from tutor import env as tutor_env
 from tutor.commands.k8s import K8sContext
 
 from .cloudfront import CloudFrontClient
 
+# Serializes the progress messages of the concurrently provisioned domains.
+_ECHO_LOCK = threading.Lock()
+
 
 @click.group(help="Commands for configuring CloudFront.")
 @click.pass_context
@@ -17,6 +28,130 @@ def cloudfront(context: click.Context) -> None:
     context.obj = K8sContext(context.obj.root)
 
 
+def _state_path(root: str) -> str:
+    """
+    Return the path of the file storing the IDs of the created policies.
+    """
+
+    return tutor_env.pathjoin(root, "plugins", "cloudfront", "state.json")
+
+
+def _load_state(root: str) -> Dict[str, Dict[str, str]]:
+    """
+    Load the policy IDs recorded by previous runs, keyed by domain.
+
+    The state is only a cache, hence a missing, unreadable, or invalid state
+    file is treated as empty, and the policies are looked up by name instead.
+    """
+
+    try:
+        with open(_state_path(root), encoding="utf-8") as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(state, dict):
+        return {}
+
+    # Drop the malformed entries, keeping only the domains mapped to string IDs.
+    return {
+        domain: policy_ids
+        for domain, policy_ids in state.items()
+        if isinstance(policy_ids, dict) and all(isinstance(policy_id, str) for policy_id in policy_ids.values())
+    }
+
+
+def _save_state(root: str, state: Dict[str, Dict[str, str]]) -> None:
+    """
+    Record the policy IDs, so the next runs can fetch the policies by ID.
+    """
+
+    path = _state_path(root)
+    state_dir = os.path.dirname(path)
+    os.makedirs(state_dir, exist_ok=True)
+
+    # Write to a temporary file first and move it in place, so an interrupted
+    # write never leaves a truncated state file behind.
+    fd, tmp_path = tempfile.mkstemp(dir=state_dir, prefix=".state-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _echo(message: str) -> None:
+    """
+    Print a progress message without interleaving it with other threads' output.
+    """
+
+    with _ECHO_LOCK:
+        click.echo(message)
+
+
+def _provision_domain(
+    client: CloudFrontClient,
+    domain: str,
+    origin_config: Dict[str, Any],
+    cache_config: Dict[str, int],
+    policy_ids: Dict[str, str],
+) -> Dict[str, str]:
+    """
+    Create the CloudFront resources of a domain that do not exist yet.
+
+    Returns the IDs of the domain's policies, to be passed as ``policy_ids``
+    on the next run, so the policies can be fetched by ID.
+    """
+
+    request_policy_name = f"{domain}-origin-request-policy"
+    if (
+        request_policy := client.get_origin_request_policy(
+            request_policy_name, policy_ids.get("origin_request_policy_id")
+        )
+    ) is None:
+        _echo(f"Creating origin request policy for {domain}")
+        request_policy = client.create_origin_request_policy(request_policy_name)
+
+    response_policy_name = f"{domain}-response-headers-policy"
+    if (
+        response_policy := client.get_response_headers_policy(
+            response_policy_name, policy_ids.get("response_headers_policy_id")
+        )
+    ) is None:
+        _echo(f"Creating response headers policy for {domain}")
+        response_policy = client.create_response_headers_policy(response_policy_name)
+
+    cache_policy_name = f"{domain}-cache-policy"
+    if (cache_policy := client.get_cache_policy(cache_policy_name, policy_ids.get("cache_policy_id"))) is None:
+        _echo(f"Creating cache policy for {domain}")
+        cache_policy = client.create_cache_policy(
+            name=cache_policy_name,
+            default_ttl=cache_config["default_ttl"],
+            min_ttl=cache_config["min_ttl"],
+            max_ttl=cache_config["max_ttl"],
+        )
+
+    if client.get_distribution(domain) is None:
+        _echo(f"Creating distribution for {domain}")
+        client.create_distribution(
+            domain=domain,
+            cache_policy_id=cache_policy["Id"],
+            origin_request_policy_id=request_policy["Id"],
+            response_headers_policy_id=response_policy["Id"],
+            alias=origin_config.get("alias"),
+        )
+
+    _echo(f"CloudFront is set up for {domain}")
+
+    return {
+        "cache_policy_id": cache_policy["Id"],
+        "origin_request_policy_id": request_policy["Id"],
+        "response_headers_policy_id": response_policy["Id"],
+    }
+
+
 @cloudfront.command(help="Configure CloudFront resources")
 @click.pass_obj
 def create_cloudfront_resources(context: click.Context) -> None:
@@ -33,7 +168,7 @@ def create_cloudfront_resources(context: click.Context) -> None:
     )
 
     cache_config: Dict[str, int] = loaded_config["CLOUDFRONT_CACHE_CONFIG"]  # type: ignore
-    extra_config: List[dict] = loaded_config["CLOUDFRONT_EXTRA_DOMAINS"]  # type: ignore
+    extra_config: list[dict] = loaded_config["CLOUDFRONT_EXTRA_DOMAINS"]  # type: ignore
 
     origins: Dict[str, Dict[str, Any]] = {
         f"{loaded_config['CLOUDFRONT_LMS_DOMAIN']}": {},
@@ -44,31 +179,45 @@ def create_cloudfront_resources(context: click.Context) -> None:
         },
     }
 
-    for domain, origin_config in origins.items():
-        request_policy_name = f"{domain}-origin-request-policy"
-        if (request_policy := client.get_origin_request_policy(request_policy_name)) is None:
-            request_policy = client.create_origin_request_policy(request_policy_name)
-
-        response_policy_name = f"{domain}-response-headers-policy"
-        if (response_policy := client.get_response_headers_policy(response_policy_name)) is None:
-            response_policy = client.create_response_headers_policy(response_policy_name)
-
-        cache_policy_name = f"{domain}-cache-policy"
-        if (cache_policy := client.get_cache_policy(cache_policy_name)) is None:
-            cache_policy = client.create_cache_policy(
-                name=cache_policy_name,
-                default_ttl=cache_config["default_ttl"],
-                min_ttl=cache_config["min_ttl"],
-                max_ttl=cache_config["max_ttl"],
-            )
-
-        if client.get_distribution(domain) is None:
-            client.create_distribution(
-                domain=domain,
-                cache_policy_id=cache_policy["Id"],
-                origin_request_policy_id=request_policy["Id"],
-                response_headers_policy_id=response_policy["Id"],
-                alias=origin_config.get("alias"),
-            )
-
-    click.echo(f"CloudFront is set up for {domain}")
+    state = _load_state(context.root)  # type: ignore
+
+    # Load the listings concurrently upfront, instead of the domain workers
+    # waiting for each other to load them one by one. The policies only need
+    # to be listed if there are domains without recorded policy IDs.
+    listings = [client.list_distributions]
+    if any(domain not in state for domain in origins):
+        listings += [
+            client.list_cache_policies,
+            client.list_origin_request_policies,
+            client.list_response_headers_policies,
+        ]
+
+    with ThreadPoolExecutor(max_workers=len(listings)) as executor:
+        for listing_future in [executor.submit(listing) for listing in listings]:
+            listing_future.result()
+
+    # The domains are independent of each other, so they are provisioned
+    # concurrently instead of waiting for the API calls one domain at a time.
+    # A failing domain does not stop recording the others' policy IDs; the
+    # first error is raised once every domain is done and the state is saved.
+    errors: list[BaseException] = []
+    try:
+        with ThreadPoolExecutor(max_workers=min(8, len(origins))) as executor:
+            futures = {
+                executor.submit(
+                    _provision_domain, client, domain, origin_config, cache_config, state.get(domain, {})
+                ): domain
+                for domain, origin_config in origins.items()
+            }
+
+            for future in as_completed(futures):
+                if (error := future.exception()) is not None:
+                    _echo(f"Failed to set up CloudFront for {futures[future]}: {error}")
+                    errors.append(error)
+                else:
+                    state[futures[future]] = future.result()
+    finally:
+        _save_state(context.root, state)  # type: ignore
+
+    if errors:
+        raise errors[0]
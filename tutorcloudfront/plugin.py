@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import os
-from glob import glob
 
 import click
 import importlib_resources
@@ -169,9 +168,11 @@ hooks.Filters.ENV_TEMPLATE_TARGETS.add_items(
 
 # For each file in tutorcloudfront/patches,
 # apply a patch based on the file's name and contents.
-for path in glob(str(importlib_resources.files("tutorcloudfront") / "patches" / "*")):
-    with open(path, encoding="utf-8") as patch_file:
-        hooks.Filters.ENV_PATCHES.add_item((os.path.basename(path), patch_file.read()))
+with os.scandir(str(importlib_resources.files("tutorcloudfront") / "patches")) as patch_entries:
+    for entry in patch_entries:
+        if entry.is_file() and not entry.name.startswith("."):
+            with open(entry.path, encoding="utf-8") as patch_file:
+                hooks.Filters.ENV_PATCHES.add_item((entry.name, patch_file.read()))
 
 ########################################
 # CUSTOM JOBS (a.k.a. "do-commands")